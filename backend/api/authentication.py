@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .metrics import count_cache
+
+
+class TokenCache:
+    prefix = 'auth:token'
+
+    def __init__(self):
+        self._local = {}
+
+    def get_cache_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get(self, key):
+        entry = self._local.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            count_cache('token', 'local_hit')
+            return entry[0]
+        user = cache.get(self.get_cache_key(key))
+        if user is None:
+            count_cache('token', 'miss')
+            return None
+        count_cache('token', 'hit')
+        self.set_local(key, user)
+        return user
+
+    def set_local(self, key, user):
+        if len(self._local) >= settings.TOKEN_LOCAL_CACHE_SIZE:
+            self._local.clear()
+        self._local[key] = (
+            user, time.monotonic() + settings.TOKEN_LOCAL_CACHE_TIMEOUT)
+
+    def set(self, key, user):
+        cache.set(self.get_cache_key(key), user, settings.TOKEN_CACHE_TIMEOUT)
+        self.set_local(key, user)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        cache.delete_many([self.get_cache_key(key) for key in keys])
+        for key in keys:
+            self._local.pop(key, None)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
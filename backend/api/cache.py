@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import count_cache
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def bump_versions(keys):
+    transaction.on_commit(
+        lambda: cache.set_many(dict.fromkeys(keys, time.time()), None)
+    )
+
+
+class RecipeResponseCache:
+    prefix = 'recipes'
+
+    @property
+    def list_key(self):
+        return f'{self.prefix}:version:list'
+
+    def recipe_key(self, pk):
+        return f'{self.prefix}:version:{pk}'
+
+    def invalidate(self, recipe_ids=(), lists=False):
+        keys = [self.recipe_key(pk) for pk in set(recipe_ids)]
+        if lists:
+            keys.append(self.list_key)
+        if keys:
+            bump_versions(keys)
+
+    def is_cacheable(self, request):
+        return (
+            request.method == 'GET'
+            and request.user.is_anonymous
+            and 'ordering' not in request.query_params
+        )
+
+    def get_cache_key(self, request):
+        query = urlencode(sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        ))
+        return (f'{self.prefix}:response:{request.get_host()}'
+                f'{request.path}?{query}')
+
+    def get_version_keys(self, data):
+        if 'results' in data:
+            return [self.list_key] + [
+                self.recipe_key(recipe['id']) for recipe in data['results']
+            ]
+        return [self.recipe_key(data['id'])]
+
+    def get_entry(self, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        versions = get_versions(list(entry['versions']))
+        if versions != entry['versions']:
+            return None
+        return entry
+
+    def is_not_modified(self, request, entry):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return entry['etag'] in (
+                tag.strip() for tag in if_none_match.split(','))
+        if_modified_since = parse_http_date_safe(
+            request.headers.get('If-Modified-Since', ''))
+        return (if_modified_since is not None
+                and int(entry['last_modified']) <= if_modified_since)
+
+    def make_entry(self, key, data):
+        versions = get_versions(self.get_version_keys(data))
+        signature = f'{key}|' + '|'.join(
+            f'{name}={versions[name]}' for name in sorted(versions))
+        return {
+            'data': data,
+            'versions': versions,
+            'etag': '"{}"'.format(hashlib.md5(signature.encode()).hexdigest()),
+            'last_modified': max(versions.values()),
+        }
+
+    def respond(self, request, build):
+        if not self.is_cacheable(request):
+            return build()
+        key = self.get_cache_key(request)
+        entry = self.get_entry(key)
+        count_cache('recipes', 'miss' if entry is None else 'hit')
+        if entry is None:
+            started = time.time()
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = self.make_entry(key, response.data)
+            if entry['last_modified'] < started:
+                cache.set(key, entry, settings.RECIPE_CACHE_TIMEOUT)
+        if self.is_not_modified(request, entry):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        response['Cache-Control'] = settings.RECIPE_CACHE_CONTROL
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class ReferenceDataCache:
+    prefix = 'reference'
+
+    def __init__(self):
+        self._blobs = {}
+
+    def version_key(self, name):
+        return f'{self.prefix}:version:{name}'
+
+    def get_version(self, name):
+        key = self.version_key(name)
+        return get_versions([key])[key]
+
+    def invalidate(self, name):
+        bump_versions([self.version_key(name)])
+
+    def get_blob(self, name, build):
+        version = self.get_version(name)
+        blob = self._blobs.get(name)
+        if blob is not None and blob['version'] == version:
+            count_cache('reference', 'local_hit')
+            return blob
+        key = f'{self.prefix}:{name}:{version}'
+        blob = cache.get(key)
+        count_cache('reference', 'miss' if blob is None else 'hit')
+        if blob is None:
+            content = build()
+            blob = {
+                'version': version,
+                'etag': hashlib.md5(content).hexdigest(),
+                'content': content,
+                'gzip': gzip.compress(content),
+            }
+            cache.set(key, blob, settings.REFERENCE_CACHE_TIMEOUT)
+        self._blobs[name] = blob
+        return blob
+
+    def respond(self, request, name, build):
+        blob = self.get_blob(name, build)
+        etags = (f'"{blob["etag"]}"', f'"{blob["etag"]}-gzip"')
+        use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+        if_none_match = request.headers.get('If-None-Match', '')
+        if any(tag.strip() in etags for tag in if_none_match.split(',')):
+            response = HttpResponseNotModified()
+        elif use_gzip:
+            response = HttpResponse(
+                blob['gzip'], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                blob['content'], content_type='application/json')
+        response['ETag'] = etags[use_gzip]
+        response['Cache-Control'] = settings.REFERENCE_CACHE_CONTROL
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+recipe_cache = RecipeResponseCache()
+reference_cache = ReferenceDataCache()
@@ -1,6 +1,10 @@
 import django_filters as filters
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
 
-from recipes.models import Recipe, Ingredient
+from recipes.models import Recipe, Ingredient, Tag
+from users.models import User
+from .search import search_recipes
 
 
 class IngredientSearchFilter(filters.FilterSet):
@@ -12,8 +16,15 @@ class IngredientSearchFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
-    author = filters.AllValuesMultipleFilter(field_name='author__id')
+    tags = filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        to_field_name='slug',
+        method='filter_tags'
+    )
+    author = filters.ModelMultipleChoiceFilter(
+        queryset=User.objects.all(),
+        distinct=False
+    )
     is_favorited = filters.CharFilter(
         method='filter_is_favorited'
     )
@@ -21,6 +32,14 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
 
+    def filter_tags(self, queryset, name, value):
+        if value:
+            return queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__in=value)
+            ))
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
         if value:
             return queryset.filter(favorites__user=self.request.user)
@@ -40,3 +59,16 @@ class RecipeFilter(filters.FilterSet):
             'is_favorited',
             'is_in_shopping_cart'
         ]
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.search_param, '').strip()
+        if not value:
+            return queryset
+        queryset = search_recipes(queryset, value)
+        if OrderingFilter.ordering_param in request.query_params:
+            return queryset
+        return queryset.order_by('-rank', '-pub_date', '-id')
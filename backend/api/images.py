@@ -0,0 +1,94 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from .cache import recipe_cache
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (
+    ('webp', 'WEBP'),
+    ('jpeg', 'JPEG'),
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='image-variants'
+)
+
+
+def encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.IMAGE_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(name):
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {}
+    for size, width in settings.IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width), Image.Resampling.LANCZOS)
+        variants[size] = {
+            extension: default_storage.save(
+                f'{settings.IMAGE_VARIANTS_DIR}/{stem}-{size}.{extension}',
+                encode(resized, image_format)
+            )
+            for extension, image_format in FORMATS
+        }
+    return variants
+
+
+def variant_paths(image_variants):
+    return [
+        path
+        for size in settings.IMAGE_VARIANTS
+        for path in image_variants.get(size, {}).values()
+    ]
+
+
+def build_variants(recipe_id, name):
+    close_old_connections()
+    try:
+        previous = Recipe.objects.filter(pk=recipe_id).values_list(
+            'image_variants', flat=True).first() or {}
+        variants = render_variants(name)
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants={'source': name, **variants}
+        )
+        stale = variant_paths(previous) if updated else variant_paths(
+            variants)
+        for path in stale:
+            default_storage.delete(path)
+        if updated:
+            recipe_cache.invalidate([recipe_id])
+    except Exception:
+        logger.exception('Could not build image variants for recipe %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe):
+    if not recipe.image:
+        return
+    if recipe.image_variants.get('source') == recipe.image.name:
+        return
+    recipe_id, name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(build_variants, recipe_id, name)
+    )
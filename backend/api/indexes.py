@@ -0,0 +1,187 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Ingredient, RecipeIngredients
+from .cache import bump_versions, get_versions, reference_cache
+
+
+def fold(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = (None, [], [])
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (fold(ingredient.name), ingredient.id)
+        )
+        keys = [fold(ingredient.name) for ingredient in ingredients]
+        return version, keys, ingredients
+
+    def _get_data(self):
+        version = reference_cache.get_version('ingredients')
+        data = self._data
+        if data[0] != version:
+            with self._lock:
+                data = self._data
+                if data[0] != version:
+                    data = self._data = self._build(version)
+        return data
+
+    def search(self, query, limit=None):
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        query = fold(query)
+        _, keys, ingredients = self._get_data()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit:
+            if not keys[end].startswith(query):
+                break
+            end += 1
+        result = ingredients[start:end]
+        if len(result) < limit:
+            for i, key in enumerate(keys):
+                if query in key and not start <= i < end:
+                    result.append(ingredients[i])
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+class RankedRecipes:
+    def __init__(self, matches, sizes):
+        self.matches = matches
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.matches)
+
+    def rank_key(self, item):
+        recipe_id, matched = item
+        return matched / self.sizes[recipe_id], matched, recipe_id
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        top = heapq.nlargest(stop, self.matches.items(), key=self.rank_key)
+        return [
+            (recipe_id, matched, self.sizes[recipe_id])
+            for recipe_id, matched in top[start:stop]
+        ]
+
+
+class RecipeIngredientIndex:
+    prefix = 'recipe-ingredients'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._seq = 0
+        self._postings = {}
+        self._recipes = {}
+
+    @property
+    def generation_key(self):
+        return f'{self.prefix}:generation'
+
+    @property
+    def seq_key(self):
+        return f'{self.prefix}:seq'
+
+    def change_key(self, seq):
+        return f'{self.prefix}:change:{seq}'
+
+    def invalidate(self):
+        bump_versions([self.generation_key])
+
+    def changed(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self._publish(recipe_ids))
+
+    def _publish(self, recipe_ids):
+        cache.add(self.seq_key, 0, None)
+        seq = cache.incr(self.seq_key)
+        cache.set(self.change_key(seq), recipe_ids,
+                  settings.RECIPE_INDEX_CHANGE_TIMEOUT)
+
+    def _build(self, generation, seq):
+        postings = {}
+        recipes = {}
+        rows = RecipeIngredients.objects.order_by(
+            'ingredients_id', 'recipe_id').values_list(
+            'ingredients_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator(chunk_size=10000):
+            postings.setdefault(ingredient_id, array('i')).append(recipe_id)
+            recipes.setdefault(recipe_id, array('i')).append(ingredient_id)
+        self._generation, self._seq = generation, seq
+        self._postings, self._recipes = postings, recipes
+
+    def _remove(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            posting = self._postings[ingredient_id]
+            del posting[bisect_left(posting, recipe_id)]
+            if not posting:
+                del self._postings[ingredient_id]
+
+    def _apply(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            self._remove(recipe_id)
+        rows = RecipeIngredients.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredients_id')
+        for recipe_id, ingredient_id in rows:
+            insort(self._postings.setdefault(ingredient_id, array('i')),
+                   recipe_id)
+            self._recipes.setdefault(recipe_id, array('i')).append(
+                ingredient_id)
+
+    def _catch_up(self, seq):
+        count = seq - self._seq
+        if count > settings.RECIPE_INDEX_MAX_CHANGES:
+            return False
+        changes = cache.get_many(
+            [self.change_key(n) for n in range(self._seq + 1, seq + 1)])
+        if len(changes) < count:
+            return False
+        self._apply(set(chain.from_iterable(changes.values())))
+        self._seq = seq
+        return True
+
+    def _refresh(self):
+        generation = get_versions([self.generation_key])[self.generation_key]
+        seq = cache.get(self.seq_key, 0)
+        if generation != self._generation or seq < self._seq or (
+                seq > self._seq and not self._catch_up(seq)):
+            self._build(generation, seq)
+
+    def rank(self, ingredient_ids):
+        with self._lock:
+            self._refresh()
+            matches = Counter(chain.from_iterable(
+                self._postings.get(ingredient_id, ())
+                for ingredient_id in set(ingredient_ids)
+            ))
+            sizes = {
+                recipe_id: len(self._recipes[recipe_id])
+                for recipe_id in matches
+            }
+        return RankedRecipes(matches, sizes)
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,252 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Favorite, Ingredient, Recipe, Subscription, Tag
+from users.models import User
+
+SCENARIOS = (
+    ('recipe list', 'GET', '/api/recipes/', True),
+    ('recipe list, 50 per page', 'GET', '/api/recipes/?limit=50', True),
+    ('recipe list, last page', 'GET', '/api/recipes/?page={last_page}', True),
+    ('recipe feed', 'GET', '/api/recipes/?pagination=cursor', True),
+    ('recipes by tag', 'GET', '/api/recipes/?tags={tag}', True),
+    ('recipes by author', 'GET', '/api/recipes/?author={author}', True),
+    ('recipe search', 'GET', '/api/recipes/?search={word}', True),
+    ('recipes by ingredients', 'GET',
+     '/api/recipes/by_ingredients/?ingredients={ingredients}', True),
+    ('recipe detail', 'GET', '/api/recipes/{recipe}/', True),
+    ('similar recipes', 'GET', '/api/recipes/{recipe}/similar/', True),
+    ('favorite recipes', 'GET', '/api/recipes/?is_favorited=1', False),
+    ('shopping cart recipes', 'GET', '/api/recipes/?is_in_shopping_cart=1',
+     False),
+    ('shopping list', 'GET', '/api/recipes/download_shopping_cart/', False),
+    ('favorite add', 'POST', '/api/recipes/{other_recipe}/favorite/', False),
+    ('favorite remove', 'DELETE', '/api/recipes/{other_recipe}/favorite/',
+     False),
+    ('shopping cart add', 'POST', '/api/recipes/{other_recipe}/shopping_cart/',
+     False),
+    ('shopping cart remove', 'DELETE',
+     '/api/recipes/{other_recipe}/shopping_cart/', False),
+    ('user list', 'GET', '/api/users/', True),
+    ('user detail', 'GET', '/api/users/{author}/', False),
+    ('current user', 'GET', '/api/users/me/', False),
+    ('subscriptions', 'GET', '/api/users/subscriptions/?recipes_limit=3',
+     False),
+    ('subscription feed', 'GET', '/api/recipes/feed/', False),
+    ('subscribe', 'POST', '/api/users/{other_author}/subscribe/', False),
+    ('unsubscribe', 'DELETE', '/api/users/{other_author}/subscribe/', False),
+    ('tag list', 'GET', '/api/tags/', True),
+    ('tag detail', 'GET', '/api/tags/{tag_id}/', True),
+    ('ingredient list', 'GET', '/api/ingredients/', True),
+    ('ingredient search', 'GET', '/api/ingredients/?name={prefix}', True),
+    ('ingredient detail', 'GET', '/api/ingredients/{ingredient}/', True),
+)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(quantiles, value):
+    return round(quantiles[value - 1] * 1000, 3)
+
+
+def get_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Drives the API endpoints in-process through the Django test '
+            'client and reports latency percentiles, throughput and queries '
+            'per request as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--user',
+            help='Email of the user to authenticate as (default: the user '
+                 'with the most subscriptions)'
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            default=[],
+            help='Only run scenarios whose name contains this text'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Run with the dummy cache backend'
+        )
+        parser.add_argument('--output', help='Write the report to this file')
+
+    def get_user(self, email):
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        user = users.annotate(
+            total=Count('subscriber')).order_by('-total', 'id').first()
+        if user is None:
+            raise CommandError('No such user, generate some data first!')
+        return user
+
+    def get_sample(self, user):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        other_recipe = Recipe.objects.exclude(favorites__user=user).exclude(
+            cart__user=user).order_by('favorites_count', 'id').first()
+        other_author = User.objects.exclude(pk=user.pk).exclude(
+            subscription__user=user).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if None in (recipe, other_recipe, other_author, tag, ingredient):
+            raise CommandError('Not enough data, run generate_data first!')
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        return {
+            'recipe': recipe.id,
+            'author': recipe.author_id,
+            'other_recipe': other_recipe.id,
+            'other_author': other_author.id,
+            'tag': tag.slug,
+            'tag_id': tag.id,
+            'ingredient': ingredient.id,
+            'prefix': ingredient.name[:2],
+            'word': recipe.name.split()[0],
+            'ingredients': ','.join(
+                str(item.ingredients_id)
+                for item in recipe.recipe_ingredients.all()[:5]),
+            'last_page': max(
+                1, -(-Recipe.objects.count() // page_size)),
+        }
+
+    def get_dataset(self):
+        return {
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': Ingredient.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'subscriptions': Subscription.objects.count(),
+        }
+
+    def request(self, client, method, url):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = getattr(client, method.lower())(url)
+            elapsed = time.perf_counter() - started
+        return response, elapsed, counter.count
+
+    def run_scenarios(self, scenarios, clients, iterations):
+        timings = {scenario: [] for scenario in scenarios}
+        queries = {scenario: 0 for scenario in scenarios}
+        for _ in range(iterations):
+            for scenario in scenarios:
+                name, method, url, viewer = scenario
+                response, elapsed, count = self.request(
+                    clients[viewer], method, url)
+                if not 200 <= response.status_code < 300:
+                    raise CommandError(
+                        f'{name} ({viewer}): {method} {url} returned '
+                        f'{response.status_code}!')
+                timings[scenario].append(elapsed)
+                queries[scenario] += count
+        return timings, queries
+
+    def summarize(self, timings, queries, iterations):
+        results = []
+        for scenario, samples in timings.items():
+            name, method, url, viewer = scenario
+            quantiles = statistics.quantiles(
+                samples, n=100, method='inclusive')
+            results.append({
+                'name': name,
+                'viewer': viewer,
+                'method': method,
+                'url': url,
+                'requests': iterations,
+                'p50_ms': percentile(quantiles, 50),
+                'p95_ms': percentile(quantiles, 95),
+                'p99_ms': percentile(quantiles, 99),
+                'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+                'throughput_rps': round(iterations / sum(samples), 1),
+                'queries_per_request': round(
+                    queries[scenario] / iterations, 2),
+            })
+        return results
+
+    @contextmanager
+    def settings(self, no_cache):
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if no_cache:
+            overrides['CACHES'] = {'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(**overrides):
+            yield
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Run at least 2 iterations!')
+        user = self.get_user(options['user'])
+        sample = self.get_sample(user)
+        token, _ = Token.objects.get_or_create(user=user)
+        clients = {
+            'anonymous': Client(),
+            'user': Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+        }
+        scenarios = [
+            (name, method, url.format(**sample), viewer)
+            for name, method, url, anonymous in SCENARIOS
+            for viewer in (('anonymous', 'user') if anonymous else ('user',))
+            if not options['only']
+            or any(text in name for text in options['only'])
+        ]
+        if not scenarios:
+            raise CommandError('No scenarios match --only!')
+        with self.settings(options['no_cache']):
+            self.run_scenarios(scenarios, clients, options['warmup'])
+            timings, queries = self.run_scenarios(
+                scenarios, clients, options['iterations'])
+        report = {
+            'revision': get_revision(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache': not options['no_cache'],
+            'iterations': options['iterations'],
+            'dataset': self.get_dataset(),
+            'results': self.summarize(
+                timings, queries, options['iterations']),
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content + '\n')
+            self.stderr.write(f'Report written to {options["output"]}')
+        else:
+            self.stdout.write(content)
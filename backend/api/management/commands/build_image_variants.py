@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Builds resized WebP/JPEG variants of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild variants that already exist'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').values_list(
+            'id', 'image', 'image_variants')
+        built = 0
+        for recipe_id, name, variants in list(recipes):
+            if options['all'] or variants.get('source') != name:
+                build_variants(recipe_id, name)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Built image variants for {built} recipes'))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import rebuild_similar
+
+
+class Command(BaseCommand):
+    help = ('Precomputes the nearest recipes by ingredient and tag overlap '
+            'for every recipe')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_similar()
+        self.stdout.write(self.style.SUCCESS(
+            f'Built similar recipes for {count} recipes in '
+            f'{time.monotonic() - started:.2f}s'))
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+QUERY_BUDGETS = (
+    ('recipe list', '/api/recipes/', 5, True),
+    ('recipe list, 50 per page', '/api/recipes/?limit=50', 5, True),
+    ('recipes by tag', '/api/recipes/?tags={tag}', 6, True),
+    ('recipe feed', '/api/recipes/?pagination=cursor', 4, True),
+    ('recipe detail', '/api/recipes/{recipe}/', 4, True),
+    ('similar recipes', '/api/recipes/{recipe}/similar/', 1, True),
+    ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', 3, False),
+    ('subscription feed', '/api/recipes/feed/', 4, False),
+    ('user list', '/api/users/', 2, True),
+    ('user detail', '/api/users/{author}/', 1, False),
+)
+
+
+class Command(BaseCommand):
+    help = ('Requests API endpoints against the current database and fails '
+            'if any of them runs more SQL queries than its budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of the user to authenticate as (default: first user)'
+        )
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'User {email} does not exist!')
+            return user
+        return User.objects.order_by('id').first()
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}!')
+        return len(queries)
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if recipe is None:
+            raise CommandError('Load some recipes first!')
+        tag = recipe.tags.first() or Tag.objects.first()
+        if tag is None:
+            raise CommandError('Load some tags first!')
+        clients = {'anonymous': APIClient()}
+        user = self.get_user(options['user'])
+        if user is not None:
+            clients[user.email] = APIClient()
+            clients[user.email].force_authenticate(user)
+        failures = []
+        for name, url, budget, anonymous in QUERY_BUDGETS:
+            url = url.format(
+                recipe=recipe.id, tag=tag.slug, author=recipe.author_id)
+            for viewer, client in clients.items():
+                if viewer == 'anonymous' and not anonymous:
+                    continue
+                count = self.count_queries(client, url)
+                line = f'{name} ({viewer}): {count}/{budget} queries'
+                if count > budget:
+                    failures.append(line)
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        if failures:
+            raise CommandError(
+                f'{len(failures)} endpoint(s) over query budget!')
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
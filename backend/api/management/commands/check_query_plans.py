@@ -0,0 +1,183 @@
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.search import search_recipes
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+ENDPOINTS = (
+    ('recipe list', '/api/recipes/', True),
+    ('recipe feed', '/api/recipes/?pagination=cursor', True),
+    ('recipe detail', '/api/recipes/{recipe}/', True),
+    ('recipes by author', '/api/recipes/?author={author}', True),
+    ('recipes by tag', '/api/recipes/?tags={tag}', True),
+    ('favorite recipes', '/api/recipes/?is_favorited=1', False),
+    ('shopping cart recipes', '/api/recipes/?is_in_shopping_cart=1', False),
+    ('shopping list', '/api/recipes/download_shopping_cart/', False),
+    ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', False),
+    ('subscription feed', '/api/recipes/feed/', False),
+    ('current user', '/api/users/me/', False),
+)
+QUERYSETS = (
+    ('ingredient search',
+     lambda sample: Ingredient.objects.filter(
+         name__istartswith=sample['prefix']),
+     ('postgresql',)),
+    ('recipe search',
+     lambda sample: search_recipes(Recipe.objects.all(), sample['word']),
+     ('postgresql',)),
+)
+UNFILTERED_COUNT = re.compile(r'^SELECT COUNT\(\*\) AS "__count" FROM "\w+"$')
+ALIAS = re.compile(r'"(\w+)" (?:AS )?([A-Z]\d+)\b')
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def walk_plan(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from walk_plan(child)
+
+
+class Command(BaseCommand):
+    help = ('Runs EXPLAIN on the queries behind the API endpoints against '
+            'the current database and fails if any of them scans a large '
+            'table sequentially')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=10000,
+            help='Tables with at least this many rows count as large '
+                 '(default: 10000)'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the user to authenticate as (default: the '
+                 'author with the most recipes)'
+        )
+
+    def get_large_tables(self, min_rows):
+        sizes = {
+            model._meta.db_table: model._default_manager.count()
+            for model in apps.get_models(include_auto_created=True)
+            if not model._meta.proxy
+        }
+        return {table for table, rows in sizes.items() if rows >= min_rows}
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f'User {email} does not exist!')
+            return user
+        return User.objects.order_by('-recipes_count').first()
+
+    def get_sample(self):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        if recipe is None:
+            raise CommandError('Load some recipes first!')
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        return {
+            'recipe': recipe.id,
+            'author': recipe.author_id,
+            'tag': tag.slug if tag else '',
+            'prefix': ingredient.name[:2] if ingredient else 'a',
+            'word': recipe.name.split()[0],
+        }
+
+    def explain_postgresql(self, cursor, sql):
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0][0]['Plan']
+        return [
+            node['Relation Name'] for node in walk_plan(plan)
+            if node['Node Type'] == 'Seq Scan'
+        ]
+
+    def explain_sqlite(self, cursor, sql):
+        aliases = dict(
+            (alias, table) for table, alias in ALIAS.findall(sql))
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        scans = []
+        for row in cursor.fetchall():
+            match = SQLITE_SCAN.match(row[-1])
+            if match:
+                scans.append(aliases.get(match[1], match[1]))
+        return scans
+
+    def get_seq_scans(self, sql):
+        explain = getattr(self, f'explain_{connection.vendor}', None)
+        if explain is None:
+            raise CommandError(
+                f'EXPLAIN is not supported for {connection.vendor}!')
+        with connection.cursor() as cursor:
+            return explain(cursor, sql)
+
+    def check_queries(self, name, queries, large_tables):
+        failures = []
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or UNFILTERED_COUNT.match(sql):
+                continue
+            scans = sorted(set(self.get_seq_scans(sql)) & large_tables)
+            if scans:
+                failures.append(f'{name}: sequential scan on '
+                                f'{", ".join(scans)}\n  {sql}')
+        return failures
+
+    def capture_endpoint(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}!')
+        return queries.captured_queries
+
+    def capture_queryset(self, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            list(queryset)
+        return queries.captured_queries
+
+    @override_settings(ALLOWED_HOSTS=['*'], CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    })
+    def handle(self, *args, **options):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        large_tables = self.get_large_tables(options['min_rows'])
+        if not large_tables:
+            self.stdout.write(self.style.WARNING(
+                f'No table has {options["min_rows"]} rows, seed more data '
+                f'to make the plans meaningful'))
+        sample = self.get_sample()
+        clients = {'anonymous': APIClient(), 'user': APIClient()}
+        clients['user'].force_authenticate(self.get_user(options['user']))
+        failures = []
+        for name, url, anonymous in ENDPOINTS:
+            url = url.format(**sample)
+            for viewer, client in clients.items():
+                if viewer == 'anonymous' and not anonymous:
+                    continue
+                failures += self.check_queries(
+                    f'{name} ({viewer})',
+                    self.capture_endpoint(client, url),
+                    large_tables
+                )
+        for name, build, vendors in QUERYSETS:
+            if connection.vendor not in vendors:
+                continue
+            failures += self.check_queries(
+                name, self.capture_queryset(build(sample)), large_tables)
+        for failure in failures:
+            self.stdout.write(self.style.ERROR(failure))
+        if failures:
+            raise CommandError(
+                f'{len(failures)} sequential scan(s) on large tables!')
+        self.stdout.write(self.style.SUCCESS(
+            f'No sequential scans on {len(large_tables)} large table(s)'))
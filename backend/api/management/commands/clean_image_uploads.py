@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.uploads import clean_uploads
+
+
+class Command(BaseCommand):
+    help = ('Deletes expired image uploads that were never attached to a '
+            'recipe, together with their files')
+
+    def handle(self, *args, **options):
+        removed = clean_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed} expired image upload(s)'))
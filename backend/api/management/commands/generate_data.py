@@ -0,0 +1,184 @@
+import os
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import recipe_cache
+from api.indexes import recipe_ingredient_index
+from api.similarity import rebuild_similar
+from recipes.counters import recount
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredients, Subscription, Tag)
+from users.models import User
+from .load_data import raw_dates
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B56576', 'baking'),
+    ('Суп', '#2D9CDB', 'soup'),
+)
+IMAGE_NAME = 'synthetic.png'
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = ('Generates a reproducible synthetic dataset of users, recipes, '
+            'favorites, shopping carts and subscriptions on top of the real '
+            'ingredient list')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(
+                os.path.dirname(settings.BASE_DIR), 'data',
+                'ingredients.json'),
+            help='Ingredient list to load when the table is empty'
+        )
+
+    def get_image(self):
+        name = os.path.join(Recipe.image.field.upload_to, IMAGE_NAME)
+        if not default_storage.exists(name):
+            buffer = BytesIO()
+            Image.new('RGB', (1280, 960), '#E26C2D').save(buffer, 'PNG')
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        return name
+
+    def get_ingredient_ids(self, path):
+        if not Ingredient.objects.exists():
+            call_command('load_data', path, stdout=self.stdout)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('No ingredients to build recipes from!')
+        return ingredient_ids
+
+    def get_tag_ids(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count, batch_size):
+        start = User.objects.count()
+        password = make_password(PASSWORD)
+        return User.objects.bulk_create([
+            User(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name=f'Фамилия {number}',
+                password=password
+            )
+            for number in range(start, start + count)
+        ], batch_size=batch_size)
+
+    def create_recipes(self, users, per_user, batch_size):
+        start = Recipe.objects.count()
+        image = self.get_image()
+        now = timezone.now()
+        recipes = [
+            Recipe(
+                author=author,
+                name=f'Рецепт {start + number}',
+                image=image,
+                text='Смешать, нагреть и подавать к столу.',
+                cooking_time=self.random.randint(5, 180),
+                pub_date=now - timedelta(
+                    minutes=self.random.randint(0, 60 * 24 * 365))
+            )
+            for number, author in enumerate(
+                author for author in users for _ in range(per_user))
+        ]
+        with raw_dates(Recipe):
+            return Recipe.objects.bulk_create(recipes, batch_size=batch_size)
+
+    def create_recipe_relations(self, recipes, ingredient_ids, tag_ids,
+                                per_recipe, batch_size):
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(
+                recipe=recipe,
+                ingredients_id=ingredient_id,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient_id in self.random.sample(
+                ingredient_ids, min(per_recipe, len(ingredient_ids)))
+        ], batch_size=batch_size)
+        through = Recipe.tags.through
+        through.objects.bulk_create([
+            through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in self.random.sample(
+                tag_ids, self.random.randint(1, min(3, len(tag_ids))))
+        ], batch_size=batch_size)
+
+    def create_user_relations(self, model, field, users, targets, per_user,
+                              batch_size):
+        rows = []
+        for user in users:
+            chosen = self.random.sample(targets, min(per_user, len(targets)))
+            rows += [
+                model(user=user, **{field: target})
+                for target in chosen if target != user
+            ]
+        model.objects.bulk_create(
+            rows, batch_size=batch_size, ignore_conflicts=True)
+        return len(rows)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        ingredient_ids = self.get_ingredient_ids(options['ingredients'])
+        with transaction.atomic():
+            tag_ids = self.get_tag_ids()
+            users = self.create_users(options['users'], batch_size)
+            recipes = self.create_recipes(
+                users, options['recipes_per_user'], batch_size)
+            self.create_recipe_relations(
+                recipes, ingredient_ids, tag_ids,
+                options['ingredients_per_recipe'], batch_size)
+            counts = {
+                'users': len(users),
+                'recipes': len(recipes),
+                'favorites': self.create_user_relations(
+                    Favorite, 'recipe', users, recipes,
+                    options['favorites_per_user'], batch_size),
+                'carts': self.create_user_relations(
+                    Cart, 'recipe', users, recipes,
+                    options['carts_per_user'], batch_size),
+                'subscriptions': self.create_user_relations(
+                    Subscription, 'author', users, users,
+                    options['subscriptions_per_user'], batch_size),
+            }
+            recount(apps)
+            recipe_cache.invalidate(lists=True)
+            recipe_ingredient_index.invalidate()
+            rebuild_similar()
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(counts.values())} rows in '
+            f'{time.monotonic() - started:.2f}s'))
@@ -0,0 +1,224 @@
+import csv
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from api.cache import reference_cache
+from api.indexes import recipe_ingredient_index
+from api.similarity import rebuild_similar
+from recipes.counters import recount
+
+CATALOG_MODELS = ('recipes.ingredient', 'recipes.tag')
+RECIPE_MODELS = (
+    'users.user',
+    'recipes.recipe',
+    'recipes.recipeingredients',
+    'recipes.favorite',
+    'recipes.cart',
+    'recipes.subscription',
+)
+NATURAL_KEYS = {
+    'recipes.ingredient': ('name', 'measurement_unit'),
+    'recipes.tag': ('slug',),
+}
+CSV_COLUMNS = {
+    'recipes.ingredient': ('name', 'measurement_unit'),
+    'recipes.tag': ('name', 'color', 'slug'),
+}
+WHITESPACE = re.compile(r'[\s,]*')
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON file should contain an array!')
+    position = 1
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            data = file.read(chunk_size)
+            if not data:
+                raise CommandError('Malformed JSON file!')
+            buffer = buffer[position:] + data
+            position = 0
+            continue
+        yield obj
+        position = end
+
+
+def iter_rows(path, default_model):
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8') as file:
+        if extension == '.csv':
+            columns = CSV_COLUMNS[default_model]
+            for row in csv.reader(file):
+                if row:
+                    yield default_model, None, dict(zip(columns, row))
+            return
+        if extension == '.jsonl':
+            objects = (json.loads(line) for line in file if line.strip())
+        elif extension == '.json':
+            objects = iter_json_array(file)
+        else:
+            raise CommandError(f'Unsupported file type: {path}')
+        for obj in objects:
+            if 'model' in obj:
+                yield obj['model'].lower(), obj.get('pk'), obj['fields']
+            else:
+                obj = dict(obj)
+                yield default_model, obj.pop('id', None), obj
+
+
+@contextmanager
+def raw_dates(model):
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Upserts ingredients, tags and optionally recipes from CSV, '
+            'JSON, JSONL or dumpdata fixture files in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument(
+            '--model',
+            choices=('ingredient', 'tag'),
+            default='ingredient',
+            help='Model for rows without a "model" key (default: ingredient)'
+        )
+        parser.add_argument(
+            '--with-recipes',
+            action='store_true',
+            help='Also load users, recipes, favorites, carts and '
+                 'subscriptions from fixture files'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def build(self, model, pk, fields):
+        obj = model()
+        m2m = {}
+        if pk is not None:
+            obj.pk = pk
+        for name, value in fields.items():
+            field = model._meta.get_field(name)
+            if field.many_to_many:
+                if field.remote_field.through._meta.auto_created:
+                    m2m[field] = value
+            elif field.is_relation:
+                setattr(obj, field.attname, value)
+            else:
+                setattr(obj, field.attname, field.to_python(value))
+        return obj, m2m
+
+    def flush(self, label, rows):
+        model = apps.get_model(label)
+        built = [self.build(model, pk, fields) for pk, fields in rows]
+        objs = [obj for obj, _ in built]
+        with_pk = rows[0][0] is not None
+        unique_fields = (
+            [model._meta.pk.name] if with_pk else list(NATURAL_KEYS[label])
+        )
+        update_fields = [
+            model._meta.get_field(name).attname for name in rows[0][1]
+            if name not in unique_fields
+            and not model._meta.get_field(name).many_to_many
+        ]
+        options = {'ignore_conflicts': True}
+        if update_fields:
+            options = {
+                'update_conflicts': True,
+                'unique_fields': unique_fields,
+                'update_fields': update_fields,
+            }
+        with raw_dates(model):
+            model.objects.bulk_create(objs, **options)
+        for field in {field for _, m2m in built for field in m2m}:
+            through = field.remote_field.through
+            source = field.m2m_field_name() + '_id'
+            target = field.m2m_reverse_field_name() + '_id'
+            through.objects.bulk_create([
+                through(**{source: obj.pk, target: value})
+                for obj, m2m in built for value in m2m.get(field, ())
+            ], ignore_conflicts=True)
+        if with_pk:
+            self.explicit_pks.add(model)
+
+    def load_file(self, path, allowed, default_model, batch_size):
+        batches = defaultdict(list)
+        for label, pk, fields in iter_rows(path, default_model):
+            if label not in allowed:
+                self.skipped += 1
+                continue
+            key = (label, pk is not None)
+            batches[key].append((pk, fields))
+            if len(batches[key]) >= batch_size:
+                self.flush(label, batches.pop(key))
+            self.counts[label] += 1
+        for (label, _), rows in batches.items():
+            self.flush(label, rows)
+
+    def reset_sequences(self):
+        sequences = connection.ops.sequence_reset_sql(
+            no_style(), self.explicit_pks)
+        with connection.cursor() as cursor:
+            for sql in sequences:
+                cursor.execute(sql)
+
+    def handle(self, *args, **options):
+        allowed = CATALOG_MODELS
+        if options['with_recipes']:
+            allowed += RECIPE_MODELS
+        default_model = f'recipes.{options["model"]}'
+        self.explicit_pks = set()
+        self.counts = defaultdict(int)
+        self.skipped = 0
+        started = time.monotonic()
+        with transaction.atomic():
+            for path in options['paths']:
+                self.load_file(
+                    path, allowed, default_model, options['batch_size'])
+            self.reset_sequences()
+            if options['with_recipes']:
+                recount(apps)
+        if 'recipes.ingredient' in self.counts:
+            reference_cache.invalidate('ingredients')
+        if 'recipes.tag' in self.counts:
+            reference_cache.invalidate('tags')
+        if 'recipes.recipeingredients' in self.counts:
+            recipe_ingredient_index.invalidate()
+            rebuild_similar()
+        elapsed = time.monotonic() - started
+        total = sum(self.counts.values())
+        for label, count in self.counts.items():
+            self.stdout.write(f'{label}: {count} rows')
+        if self.skipped:
+            self.stdout.write(f'skipped: {self.skipped} rows of other models')
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {total} rows in {elapsed:.2f}s '
+            f'({total / max(elapsed, 1e-6):.0f} rows/s)'
+        ))
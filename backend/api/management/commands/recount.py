@@ -0,0 +1,14 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the stored favorites, shopping carts, recipes and '
+            'followers counters')
+
+    def handle(self, *args, **options):
+        recount(apps)
+        counters = ', '.join(counter for _, counter in COUNTERS.values())
+        self.stdout.write(self.style.SUCCESS(f'Recounted {counters}'))
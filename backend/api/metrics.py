@@ -0,0 +1,94 @@
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total',
+    'HTTP requests by route, view action and status',
+    ['method', 'route', 'action', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'HTTP request latency by route and view action',
+    ['method', 'route', 'action'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'foodgram_http_requests_in_flight',
+    'HTTP requests being processed',
+    multiprocess_mode='livesum'
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'SQL queries run by a request',
+    ['route', 'action'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds',
+    'Time a request spent in SQL queries',
+    ['route', 'action'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Cache lookups by cache and result',
+    ['cache', 'result']
+)
+PDF_RENDER_DURATION = Histogram(
+    'foodgram_pdf_render_duration_seconds',
+    'Shopping list PDF render time',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+def count_cache(cache, result):
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_response():
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == settings.METRICS_PATH:
+            return metrics_response()
+        request.metrics_labels = ('unmatched', '')
+        started = time.perf_counter()
+        with REQUESTS_IN_FLIGHT.track_inprogress():
+            response = self.get_response(request)
+        route, action = request.metrics_labels
+        REQUEST_DURATION.labels(request.method, route, action).observe(
+            time.perf_counter() - started)
+        REQUESTS.labels(
+            request.method, route, action, response.status_code).inc()
+        performance = getattr(request, 'performance', None)
+        if performance is not None:
+            DB_QUERIES.labels(route, action).observe(performance.query_count)
+            DB_DURATION.labels(route, action).observe(performance.db_time)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actions = getattr(view_func, 'actions', None) or {}
+        request.metrics_labels = (
+            request.resolver_match.view_name or request.resolver_match.route,
+            actions.get(request.method.lower(), '')
+        )
@@ -0,0 +1,131 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PageLimitPagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class PubDateCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    max_page_size = settings.MAX_PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param, '')
+        if page_size.isdigit() and int(page_size) > 0:
+            return min(int(page_size), self.max_page_size)
+        return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                encoded.encode()).decode().rsplit('|', 1)
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            pub_date = None
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def encode_cursor(self, obj):
+        return urlsafe_b64encode(
+            f'{obj.pub_date.isoformat()}|{obj.pk}'.encode()).decode()
+
+    def get_results(self, queryset, cursor, limit):
+        queryset = queryset.order_by('-pub_date', '-pk')
+        if cursor is not None:
+            pub_date, pk = cursor
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        return list(queryset[:limit])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        results = self.get_results(
+            queryset, self.decode_cursor(request), page_size + 1)
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+        return results
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class FeedPagination(PubDateCursorPagination):
+    def get_results(self, queryset, cursor, limit):
+        return list(queryset.followed_by(self.request.user, cursor, limit))
+
+
+class RecipePagination(PageLimitPagination):
+    mode_query_param = 'pagination'
+    ordering_query_params = ('ordering', 'search')
+    ordered_cursor_message = (
+        'Cursor pagination always orders by publication date, it cannot be '
+        'combined with ordering or search!'
+    )
+
+    def __init__(self):
+        self.cursor_pagination = PubDateCursorPagination()
+        self.cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_pagination.cursor_query_param
+            in request.query_params
+        )
+        if self.cursor_mode and any(
+            request.query_params.get(param, '').strip()
+            for param in self.ordering_query_params
+        ):
+            raise ValidationError(self.ordered_cursor_message)
+        if self.cursor_mode:
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,148 @@
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS = re.compile(r'\(\?(?:\s*,\s*\?)+\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    sql = STRING.sub('?', sql).replace('%s', '?')
+    sql = PLACEHOLDERS.sub('(...)', NUMBER.sub('?', sql))
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.timings = defaultdict(float)
+        self.queries = Counter()
+        self.query_time = defaultdict(float)
+        self.active = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            key = fingerprint(sql)
+            self.queries[key] += 1
+            self.query_time[key] += time.perf_counter() - started
+
+    @contextmanager
+    def measure(self, name):
+        if name in self.active:
+            yield
+            return
+        self.active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - started
+            self.active.discard(name)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def db_time(self):
+        return sum(self.query_time.values())
+
+    def is_slow(self):
+        return (
+            self.total * 1000 >= settings.SLOW_REQUEST_MS
+            or max(self.queries.values(), default=0)
+            >= settings.REPEATED_QUERY_THRESHOLD
+        )
+
+    def server_timing(self):
+        entries = [
+            f'total;dur={self.total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.query_count} queries"',
+        ]
+        entries += [
+            f'{name};dur={elapsed * 1000:.1f}'
+            for name, elapsed in self.timings.items()
+        ]
+        return ', '.join(entries)
+
+    def report(self, request, response):
+        lines = [
+            f'{request.method} {request.get_full_path()} '
+            f'{response.status_code}: {self.total * 1000:.1f}ms total, '
+            f'{self.query_count} queries in {self.db_time * 1000:.1f}ms'
+        ]
+        lines += [
+            f'{name} {elapsed * 1000:.1f}ms'
+            for name, elapsed in self.timings.items()
+        ]
+        top = sorted(
+            self.queries,
+            key=lambda key: (self.queries[key], self.query_time[key]),
+            reverse=True
+        )[:settings.SLOW_REQUEST_FINGERPRINTS]
+        lines += [
+            f'  {self.queries[key]:>4}x {self.query_time[key] * 1000:8.1f}ms '
+            f'{key}'
+            for key in top
+        ]
+        return '\n'.join(lines)
+
+
+def measure(name):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return nullcontext()
+    return metrics.measure(name)
+
+
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        with measure('serialize'):
+            return super().to_representation(instance)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        request.performance = metrics
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        metrics.finish()
+        response['Server-Timing'] = metrics.server_timing()
+        if settings.QUERY_COUNT_HEADER:
+            response['X-Query-Count'] = metrics.query_count
+        if metrics.is_slow():
+            logger.warning(
+                'Slow request %s', metrics.report(request, response))
+        return response
@@ -0,0 +1,71 @@
+import difflib
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramWordSimilarity)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .indexes import fold
+
+WORD = re.compile(r'\w+')
+MIN_FUZZY_LENGTH = 3
+
+
+def search_postgresql(queryset, value):
+    query = SearchQuery(
+        value, config=settings.SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_word_similar=value)
+    ).annotate(
+        rank=SearchRank(F('search_vector'), query)
+        + TrigramWordSimilarity(value, 'name')
+    )
+
+
+def match_term(term, words):
+    if term in words:
+        return 1.0
+    if any(word.startswith(term) for word in words):
+        return 0.75
+    if len(term) >= MIN_FUZZY_LENGTH and difflib.get_close_matches(
+            term, words, n=1, cutoff=settings.SEARCH_FUZZY_CUTOFF):
+        return 0.5
+    return 0.0
+
+
+def score(terms, name, text):
+    name_words = WORD.findall(fold(name))
+    text_words = WORD.findall(fold(text))
+    total = 0.0
+    for term in terms:
+        term_score = max(
+            2 * match_term(term, name_words), match_term(term, text_words))
+        if not term_score:
+            return 0.0
+        total += term_score
+    return total
+
+
+def search_in_process(queryset, value):
+    terms = WORD.findall(fold(value))
+    ranks = {}
+    for pk, name, text in queryset.order_by().values_list(
+            'pk', 'name', 'text').iterator():
+        rank = score(terms, name, text)
+        if rank:
+            ranks[pk] = rank
+    top = sorted(ranks, key=ranks.get, reverse=True)[
+        :settings.SEARCH_MAX_RESULTS]
+    return queryset.filter(pk__in=top).annotate(rank=Case(
+        *(When(pk=pk, then=Value(ranks[pk])) for pk in top),
+        default=Value(0.0),
+        output_field=FloatField()
+    ))
+
+
+def search_recipes(queryset, value):
+    if connection.vendor == 'postgresql':
+        return search_postgresql(queryset, value)
+    return search_in_process(queryset, value)
@@ -1,23 +1,40 @@
-from django.shortcuts import get_object_or_404
+from django.core.files.storage import default_storage
+from django.db import transaction
 
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from recipes.models import (Cart, Favorite, Ingredient, Recipe,
                             RecipeIngredients, Subscription, Tag)
 from users.models import User
+from .cache import recipe_cache
+from .indexes import recipe_ingredient_index
+from .performance import TimedSerializerMixin
+from .similarity import schedule_similar
+from .uploads import consume_upload, load_upload_handle
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_followed_ids(request):
+    followed_ids = getattr(request, 'followed_ids', None)
+    if followed_ids is None:
+        followed_ids = set(Subscription.objects.filter(
+            user=request.user).values_list('author_id', flat=True))
+        request.followed_ids = followed_ids
+    return followed_ids
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if request is None:
+            return False
+        user = request.user
         if user.is_anonymous or (user == obj):
             return False
-        return Subscription.objects.filter(
-            user=user,
-            author=obj
-        ).exists()
+        return obj.id in get_followed_ids(request)
 
     class Meta:
         fields = (
@@ -31,13 +48,14 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class IngredientSerializer(serializers.HyperlinkedModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Ingredient
         fields = (
@@ -47,7 +65,8 @@ class IngredientSerializer(serializers.HyperlinkedModelSerializer):
         )
 
 
-class AddIngredientsSerializer(serializers.ModelSerializer):
+class AddIngredientsSerializer(TimedSerializerMixin,
+                               serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredients')
 
     def create(self, validated_data):
@@ -61,7 +80,8 @@ class AddIngredientsSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeIngredientsSerializer(serializers.ModelSerializer):
+class RecipeIngredientsSerializer(TimedSerializerMixin,
+                                  serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredients.id')
     name = serializers.ReadOnlyField(source='ingredients.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -73,84 +93,198 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return {
+            size: {
+                extension: (
+                    request.build_absolute_uri(default_storage.url(path))
+                    if request else default_storage.url(path)
+                )
+                for extension, path in paths.items()
+            }
+            for size, paths in value.items() if size != 'source'
+        }
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
-    image = Base64ImageField(required=True, allow_null=False)
+    image = Base64ImageField(required=False, allow_null=False)
+    image_upload = serializers.CharField(write_only=True, required=False)
+    image_variants = ImageVariantsField()
     ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(read_only=True, many=True)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return Favorite.objects.filter(recipe=obj).exists()
+        return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Cart.objects.filter(user=user, recipe_id=obj.id).exists()
 
     def get_ingredients(self, obj):
-        ingredients = RecipeIngredients.objects.filter(recipe=obj)
+        ingredients = obj.recipe_ingredients.all()
+        if 'recipe_ingredients' not in getattr(
+                obj, '_prefetched_objects_cache', {}):
+            ingredients = ingredients.select_related('ingredients')
         return RecipeIngredientsSerializer(ingredients, many=True).data
 
-    def add_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            RecipeIngredients.objects.create(
-                recipe=recipe,
-                ingredients_id=ingredient.get('id'),
-                amount=ingredient.get('amount'),
+    def validate_ingredients_data(self, ingredients_data):
+        if ingredients_data and not (
+            isinstance(ingredients_data, list)
+            and all(isinstance(item, dict) for item in ingredients_data)
+        ):
+            raise serializers.ValidationError(
+                'Ingredients should be a list of objects with id and amount!'
             )
-
-    def create(self, validated_data):
-        tags_data = self.initial_data.get('tags')
-        ingredients_data = self.initial_data.get('ingredients')
-        ingredients_list = []
+        if not ingredients_data:
+            raise serializers.ValidationError(
+                'Add at least one ingredient!'
+            )
+        amounts = {}
         for ingredient in ingredients_data:
-            if int(ingredient.get('amount')) <= 0:
-                ingredient_name = get_object_or_404(
-                    Ingredient,
-                    id=ingredient.get('id')
+            try:
+                ingredient_id = int(ingredient.get('id'))
+                amount = int(ingredient.get('amount'))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(
+                    'Ingredient id and amount should be integers!'
                 )
+            if amount <= 0:
                 raise serializers.ValidationError(
                     'Amount of ingredient should be more than 0!'
                 )
-            if ingredient.get('id') in ingredients_list:
-                ingredient_name = get_object_or_404(
-                    Ingredient,
-                    id=ingredient.get('id')
-                )
+            if ingredient_id in amounts:
                 raise serializers.ValidationError(
-                    f'Ingredient {ingredient_name} is duplicated!'
+                    f'Ingredient {ingredient_id} is duplicated!'
                 )
-            ingredients_list.append(ingredient.get('id'))
-        if len(ingredients_list) == 0:
+            amounts[ingredient_id] = amount
+        missing = set(amounts) - set(Ingredient.objects.filter(
+            id__in=amounts).values_list('id', flat=True))
+        if missing:
             raise serializers.ValidationError(
-                'Add at least one ingredient!'
+                f'Ingredients {sorted(missing)} do not exist!'
+            )
+        return amounts
+
+    def validate_tags_data(self, tags_data):
+        if tags_data and not isinstance(tags_data, list):
+            raise serializers.ValidationError('Tags should be a list of ids!')
+        if not tags_data:
+            raise serializers.ValidationError('Add at least one tag!')
+        try:
+            tags = {int(tag) for tag in tags_data}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('Tag ids should be integers!')
+        missing = tags - set(Tag.objects.filter(
+            id__in=tags).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Tags {sorted(missing)} do not exist!'
+            )
+        return tags
+
+    def validate_image_upload(self, handle):
+        return load_upload_handle(self.context['request'].user, handle)
+
+    def validate(self, data):
+        if 'image_upload' in data:
+            data['image'] = data['image_upload'].image
+        elif not self.partial and 'image' not in data:
+            raise serializers.ValidationError({
+                'image': 'Upload an image or pass an image_upload handle!'
+            })
+        if 'ingredients' in self.initial_data or not self.partial:
+            data['ingredients'] = self.validate_ingredients_data(
+                self.initial_data.get('ingredients'))
+        if 'tags' in self.initial_data or not self.partial:
+            data['tags'] = self.validate_tags_data(
+                self.initial_data.get('tags'))
+        return data
+
+    def set_tags(self, recipe, tags, current=()):
+        recipe_tags = Recipe.tags.through
+        removed = set(current) - tags
+        if removed:
+            recipe_tags.objects.filter(
+                recipe=recipe, tag_id__in=removed).delete()
+        added = tags - set(current)
+        recipe_tags.objects.bulk_create([
+            recipe_tags(recipe=recipe, tag_id=tag) for tag in added
+        ])
+        if removed or added:
+            recipe_cache.invalidate([recipe.id], lists=True)
+            schedule_similar([recipe.id])
+
+    def set_ingredients(self, recipe, amounts, current=()):
+        current = {item.ingredients_id: item for item in current}
+        removed = set(current) - set(amounts)
+        if removed:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredients_id__in=removed).delete()
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        RecipeIngredients.objects.bulk_update(changed, ['amount'])
+        added = RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(
+                recipe=recipe,
+                ingredients_id=ingredient_id,
+                amount=amount
             )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ])
+        if added:
+            recipe_ingredient_index.changed([recipe.id])
+            schedule_similar([recipe.id])
+
+    def consume_image_upload(self, validated_data):
+        upload = validated_data.pop('image_upload', None)
+        if upload is not None:
+            consume_upload(upload)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        self.consume_image_upload(validated_data)
+        tags = validated_data.pop('tags')
+        amounts = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags_data)
-        self.add_ingredients(ingredients_data, recipe)
+        self.set_tags(recipe, tags)
+        self.set_ingredients(recipe, amounts)
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        recipe = Recipe.objects.get(id=instance.id)
-        if 'tags' in self.initial_data:
-            recipe.tags.clear()
-            tags_data = self.initial_data.get('tags')
-            recipe.tags.set(tags_data)
-        if 'ingredients' in self.initial_data:
-            RecipeIngredients.objects.filter(recipe=recipe).all().delete()
-            recipe.ingredients.clear()
-            ingredients_data = self.initial_data.get('ingredients')
-            self.add_ingredients(ingredients_data, recipe)
-        recipe.image = validated_data.get('image')
-        recipe.cooking_time = validated_data.get('cooking_time')
-        recipe.save()
-        return recipe
+        self.consume_image_upload(validated_data)
+        tags = validated_data.pop('tags', None)
+        amounts = validated_data.pop('ingredients', None)
+        if tags is not None:
+            self.set_tags(
+                instance, tags, [tag.id for tag in instance.tags.all()])
+        if amounts is not None:
+            self.set_ingredients(
+                instance, amounts, instance.recipe_ingredients.all())
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save()
+        return instance
 
     class Meta:
         model = Recipe
@@ -163,12 +297,21 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_upload',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+
+    def get_image(self, obj):
+        thumbnail = obj.image_variants.get('thumbnail', {}).get('jpeg')
+        url = default_storage.url(thumbnail) if thumbnail else obj.image.url
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
     class Meta:
         model = Recipe
@@ -180,13 +323,44 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class CartSerializer(serializers.ModelSerializer):
+class IngredientCoverageSerializer(ShortRecipeSerializer):
+    matched_count = serializers.ReadOnlyField()
+    ingredients_count = serializers.ReadOnlyField()
+    missing = serializers.SerializerMethodField()
+
+    def get_missing(self, obj):
+        available = self.context['ingredients']
+        return RecipeIngredientsSerializer(
+            [
+                item for item in obj.recipe_ingredients.all()
+                if item.ingredients_id not in available
+            ],
+            many=True
+        ).data
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + (
+            'matched_count',
+            'ingredients_count',
+            'missing'
+        )
+
+
+class SimilarRecipeSerializer(ShortRecipeSerializer):
+    score = serializers.ReadOnlyField()
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + ('score',)
+
+
+class CartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = '__all__'
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
     username = serializers.ReadOnlyField(source='author.username')
@@ -194,15 +368,19 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscription.objects.filter(
             user=obj.user,
             author=obj.author
         ).exists()
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'latest_recipes'):
+            return ShortRecipeSerializer(obj.latest_recipes, many=True).data
         request = self.context.get('request')
         recipes_limit = request.GET.get('recipes_limit')
         queryset = Recipe.objects.filter(author=obj.author)
@@ -210,9 +388,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             queryset = queryset[:int(recipes_limit)]
         return ShortRecipeSerializer(queryset, many=True).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
-
     def validate(self, data, pk):
         if self.request.user.id == pk:
             raise serializers.ValidationError("Selfsubscription!")
@@ -0,0 +1,108 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
+from users.models import User
+from .authentication import token_cache
+from .cache import recipe_cache, reference_cache
+from .images import schedule_variants
+from .indexes import recipe_ingredient_index
+from .similarity import schedule_similar
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    reference_cache.invalidate('ingredients')
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    reference_cache.invalidate('tags')
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, created, raw=False,
+                            **kwargs):
+    recipe_cache.invalidate([instance.id], lists=created)
+    if not raw:
+        schedule_variants(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def invalidate_searched_recipe(sender, instance, raw=False, update_fields=None,
+                               **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not {'name', 'text'} & set(
+            update_fields):
+        return
+    previous = Recipe.objects.filter(pk=instance.pk).values(
+        'name', 'text').first()
+    if previous != {'name': instance.name, 'text': instance.text}:
+        recipe_cache.invalidate(lists=True)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    recipe_cache.invalidate([instance.id], lists=True)
+    recipe_ingredient_index.changed([instance.id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        recipe_cache.invalidate([instance.id], lists=True)
+        schedule_similar([instance.id])
+    else:
+        recipe_cache.invalidate(Recipe.tags.through.objects.filter(
+            tag=instance).values_list('recipe_id', flat=True), lists=True)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredients)
+def invalidate_recipe_ingredients(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) in (Recipe, User):
+        return
+    recipe_cache.invalidate([instance.recipe_id])
+    recipe_ingredient_index.changed([instance.recipe_id])
+    schedule_similar([instance.recipe_id])
+
+
+@receiver([post_save, pre_delete], sender=Tag)
+def invalidate_tag_recipes(sender, instance, **kwargs):
+    recipe_cache.invalidate(Recipe.tags.through.objects.filter(
+        tag=instance).values_list('recipe_id', flat=True), lists=True)
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        recipe_cache.invalidate(RecipeIngredients.objects.filter(
+            ingredients=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    if created or (update_fields
+                   and set(update_fields) <= {'last_login', 'password'}):
+        return
+    recipe_cache.invalidate(
+        instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields,
+                           **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    token_cache.invalidate(Token.objects.filter(
+        user=instance).values_list('key', flat=True))
@@ -0,0 +1,196 @@
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, Min, Q
+from scipy import sparse
+
+from recipes.models import Recipe, RecipeIngredients, RecipeSimilarity
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='similar-recipes'
+)
+pending = set()
+pending_lock = Lock()
+
+
+def load_pairs(queryset, recipes):
+    if recipes is not None:
+        queryset = queryset.filter(recipes)
+    pairs = np.array(list(queryset), dtype=np.int64).reshape(-1, 2)
+    return np.unique(pairs, axis=0)
+
+
+def load_features(recipes=None):
+    ingredients = load_pairs(RecipeIngredients.objects.values_list(
+        'recipe_id', 'ingredients_id'), recipes)
+    tags = load_pairs(Recipe.tags.through.objects.values_list(
+        'recipe_id', 'tag_id'), recipes)
+    pairs = np.concatenate((ingredients, tags))
+    ids = np.unique(pairs[:, 0])
+    columns = np.concatenate((ingredients[:, 1] * 2, tags[:, 1] * 2 + 1))
+    weights = np.concatenate((
+        np.ones(len(ingredients)),
+        np.full(len(tags), settings.SIMILAR_RECIPES_TAG_WEIGHT)
+    ))
+    matrix = sparse.csr_matrix(
+        (weights, (np.searchsorted(ids, pairs[:, 0]), columns)),
+        shape=(len(ids), columns.max(initial=0) + 1)
+    )
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    return ids, sparse.diags(1 / norms) @ matrix
+
+
+def nearest(ids, scores, row, offset, limit):
+    start, end = scores.indptr[offset], scores.indptr[offset + 1]
+    columns, values = scores.indices[start:end], scores.data[start:end]
+    keep = columns != row
+    columns, values = columns[keep], values[keep]
+    if len(values) > limit:
+        lowest = np.partition(values, len(values) - limit)[-limit]
+        columns, values = columns[values >= lowest], values[values >= lowest]
+    order = np.lexsort((ids[columns], -values))[:limit]
+    return ids[columns[order]].tolist(), values[order].tolist()
+
+
+def similarities(recipe_id, similar_ids, scores):
+    return [
+        RecipeSimilarity(
+            recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for similar_id, score in zip(similar_ids, scores)
+    ]
+
+
+@transaction.atomic
+def rebuild_similar():
+    ids, matrix = load_features()
+    transposed = matrix.T.tocsr()
+    chunk_size = settings.SIMILAR_RECIPES_CHUNK_SIZE
+    RecipeSimilarity.objects.all().delete()
+    for start in range(0, len(ids), chunk_size):
+        scores = (matrix[start:start + chunk_size] @ transposed).tocsr()
+        rows = []
+        for offset in range(scores.shape[0]):
+            rows += similarities(
+                int(ids[start + offset]),
+                *nearest(ids, scores, start + offset, offset,
+                         settings.SIMILAR_RECIPES_COUNT)
+            )
+        RecipeSimilarity.objects.bulk_create(rows)
+    return len(ids)
+
+
+def update_neighbours(recipe_id, similar_ids, scores):
+    limit = settings.SIMILAR_RECIPES_COUNT
+    current = {
+        row['recipe_id']: row
+        for row in RecipeSimilarity.objects.filter(
+            recipe_id__in=similar_ids
+        ).values('recipe_id').annotate(
+            count=Count('id'), lowest=Min('score')
+        ).order_by()
+    }
+    rows = [
+        RecipeSimilarity(
+            recipe_id=similar_id, similar_id=recipe_id, score=score)
+        for similar_id, score in zip(similar_ids, scores)
+        if similar_id not in current
+        or current[similar_id]['count'] < limit
+        or score >= current[similar_id]['lowest']
+    ]
+    RecipeSimilarity.objects.bulk_create(rows)
+    overflowing = [
+        row.recipe_id for row in rows
+        if row.recipe_id in current
+        and current[row.recipe_id]['count'] >= limit
+    ]
+    kept = Counter()
+    stale = []
+    for pk, owner in RecipeSimilarity.objects.filter(
+            recipe_id__in=overflowing).order_by(
+                'recipe_id', '-score', 'similar_id').values_list(
+                    'id', 'recipe_id'):
+        kept[owner] += 1
+        if kept[owner] > limit:
+            stale.append(pk)
+    RecipeSimilarity.objects.filter(pk__in=stale).delete()
+
+
+def load_neighbourhood(recipe_id):
+    links = RecipeSimilarity.objects.filter(
+        Q(recipe_id=recipe_id) | Q(similar_id=recipe_id))
+    neighbours = {
+        pk for pair in links.values_list('recipe_id', 'similar_id')
+        for pk in pair
+    }
+    neighbours.update(RecipeSimilarity.objects.filter(
+        recipe_id__in=neighbours).values_list('similar_id', flat=True))
+    return neighbours
+
+
+def load_candidates(recipe_id):
+    ingredients = RecipeIngredients.objects.filter(
+        recipe_id=recipe_id).values('ingredients_id')
+    return list(RecipeIngredients.objects.filter(
+        ingredients_id__in=ingredients
+    ).values('recipe_id').annotate(
+        shared=Count('ingredients_id', distinct=True)
+    ).order_by('-shared', '-recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:settings.SIMILAR_RECIPES_CANDIDATES])
+
+
+@transaction.atomic
+def refresh_recipe(recipe_id):
+    neighbours = load_neighbourhood(recipe_id)
+    RecipeSimilarity.objects.filter(similar_id=recipe_id).delete()
+    RecipeSimilarity.objects.filter(recipe_id=recipe_id).delete()
+    ids, matrix = load_features(
+        Q(recipe_id=recipe_id)
+        | Q(recipe_id__in=load_candidates(recipe_id))
+        | Q(recipe_id__in=neighbours)
+    )
+    row = np.searchsorted(ids, recipe_id)
+    if row == len(ids) or ids[row] != recipe_id:
+        return
+    limit = settings.SIMILAR_RECIPES_COUNT
+    similar_ids, scores = nearest(
+        ids, (matrix[row] @ matrix.T).tocsr(), row, 0,
+        max(limit, settings.SIMILAR_RECIPES_NEIGHBOUR_UPDATES)
+    )
+    RecipeSimilarity.objects.bulk_create(similarities(
+        recipe_id, similar_ids[:limit], scores[:limit]))
+    update_neighbours(recipe_id, similar_ids, scores)
+
+
+def refresh_similar(recipe_ids):
+    with pending_lock:
+        pending.difference_update(recipe_ids)
+    close_old_connections()
+    try:
+        for recipe_id in recipe_ids:
+            refresh_recipe(recipe_id)
+    except Exception:
+        logger.exception('Could not refresh similar recipes for %s',
+                         recipe_ids)
+    finally:
+        connection.close()
+
+
+def schedule_similar(recipe_ids):
+    recipe_ids = set(recipe_ids)
+
+    def submit():
+        with pending_lock:
+            queued = recipe_ids - pending
+            pending.update(queued)
+        if queued:
+            executor.submit(refresh_similar, sorted(queued))
+
+    transaction.on_commit(submit)
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_data',
+            users=20,
+            recipes_per_user=5,
+            ingredients_per_recipe=5,
+            favorites_per_user=5,
+            carts_per_user=3,
+            subscriptions_per_user=5,
+            stdout=StringIO()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def run_command(self, name, *args):
+        out = StringIO()
+        call_command(name, *args, stdout=out)
+        return out.getvalue()
+
+
+class QueryBudgetTest(QueryTestCase):
+    def test_endpoints_within_budget(self):
+        self.assertIn('All endpoints within budget',
+                      self.run_command('check_query_budget'))
+
+
+class QueryPlanTest(QueryTestCase):
+    def test_no_sequential_scans(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('No sequential scans',
+                      self.run_command('check_query_plans', '--min-rows', '1'))
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import warnings
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+from recipes.models import ImageUpload, Recipe
+
+SALT = 'recipes.image-upload'
+EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+}
+INVALID_UPLOAD = 'Invalid or expired image upload!'
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    def __init__(self, max_size, request=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def stream_to_tempfile(stream, max_size):
+    file = tempfile.TemporaryFile()
+    size = 0
+    chunk = stream.read(settings.IMAGE_UPLOAD_CHUNK_SIZE)
+    while chunk:
+        size += len(chunk)
+        if size > max_size:
+            file.close()
+            raise UploadTooLarge
+        file.write(chunk)
+        chunk = stream.read(settings.IMAGE_UPLOAD_CHUNK_SIZE)
+    file.seek(0)
+    return file
+
+
+def too_many_pixels():
+    return serializers.ValidationError(
+        f'Image should have at most {settings.IMAGE_MAX_PIXELS} pixels!')
+
+
+def save_image(file):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(file)
+        width, height = image.size
+        image_format = image.format
+        if image_format not in EXTENSIONS:
+            raise serializers.ValidationError(
+                f'Unsupported image format: {image_format}!')
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise too_many_pixels()
+        image.verify()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise too_many_pixels()
+    except (UnidentifiedImageError, SyntaxError, OSError):
+        raise serializers.ValidationError('Upload a valid image!')
+    file.seek(0)
+    return default_storage.save(
+        os.path.join(
+            Recipe.image.field.upload_to,
+            f'{uuid4()}.{EXTENSIONS[image_format]}'
+        ),
+        File(file)
+    )
+
+
+def make_upload_handle(user, name):
+    upload = ImageUpload.objects.create(user=user, image=name)
+    return signing.dumps(upload.pk, salt=SALT)
+
+
+def load_upload_handle(user, handle):
+    try:
+        pk = signing.loads(
+            handle, salt=SALT, max_age=settings.IMAGE_UPLOAD_MAX_AGE)
+    except signing.BadSignature:
+        raise serializers.ValidationError(INVALID_UPLOAD)
+    upload = isinstance(pk, int) and ImageUpload.objects.filter(
+        pk=pk, user=user).first()
+    if not upload:
+        raise serializers.ValidationError(INVALID_UPLOAD)
+    return upload
+
+
+def consume_upload(upload):
+    deleted, _ = ImageUpload.objects.filter(pk=upload.pk).delete()
+    if not deleted:
+        raise serializers.ValidationError({'image_upload': INVALID_UPLOAD})
+    return upload.image
+
+
+def clean_uploads():
+    expired = ImageUpload.objects.filter(
+        created__lt=timezone.now()
+        - timedelta(seconds=settings.IMAGE_UPLOAD_MAX_AGE)
+    )
+    removed = 0
+    for pk, name in expired.values_list('pk', 'image'):
+        deleted, _ = ImageUpload.objects.filter(pk=pk).delete()
+        if deleted:
+            default_storage.delete(name)
+            removed += 1
+    return removed
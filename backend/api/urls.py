@@ -15,6 +15,5 @@ urlpatterns = [
         {'get': 'subscriptions'})
     ),
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include('djoser.urls')),
     path('', include(router.urls)),
 ]
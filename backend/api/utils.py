@@ -1,18 +1,47 @@
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from .metrics import PDF_RENDER_DURATION
+
+FONT = 'Arial'
+TOP_MARGIN = 800
+BOTTOM_MARGIN = 50
+LINE_HEIGHT = 25
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    pdfmetrics.registerFont(
+        TTFont(FONT, os.path.join(settings.BASE_DIR, 'Arial.ttf'), 'UTF-8')
+    )
+
 
-def http2pdf(response, list):
-    pdfmetrics.registerFont(TTFont('Arial', 'Arial.ttf', 'UTF-8'))
-    page = canvas.Canvas(response)
-    page.setFont('Arial', size=24)
-    page.drawString(200, 800, 'Shopping list')
-    page.setFont('Arial', size=16)
-    height = 750
-    for i, (name, data) in enumerate(list.items(), 1):
-        page.drawString(75, height, (f'{i}. {name} - {data["amount"]}, '
-                                     f'{data["measurement_unit"]}'))
-        height -= 25
+@PDF_RENDER_DURATION.time()
+def shopping_list_pdf(ingredients):
+    register_font()
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    page.setFont(FONT, size=24)
+    page.drawString(200, TOP_MARGIN, 'Shopping list')
+    page.setFont(FONT, size=16)
+    height = TOP_MARGIN - 2 * LINE_HEIGHT
+    for i, item in enumerate(ingredients, 1):
+        if height < BOTTOM_MARGIN:
+            page.showPage()
+            page.setFont(FONT, size=16)
+            height = TOP_MARGIN
+        page.drawString(75, height, (f'{i}. {item["name"]} - '
+                                     f'{item["amount"]}, '
+                                     f'{item["measurement_unit"]}'))
+        height -= LINE_HEIGHT
     page.showPage()
     page.save()
+    buffer.seek(0)
+    return buffer
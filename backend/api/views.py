@@ -1,65 +1,107 @@
-from django.http import HttpResponse
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Exists, F, OuterRef, Prefetch, Sum, Value
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser import views as djoser_views
 
 from rest_framework import filters
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredients, Subscription, Tag)
-from users.models import User
+                            RecipeIngredients, RecipeSimilarity,
+                            Subscription, Tag, with_is_subscribed)
+from recipes.counters import recount_targets
 from . import serializers
-from .utils import http2pdf
-from .filters import IngredientSearchFilter, RecipeFilter
+from .utils import shopping_list_pdf
+from .filters import (IngredientSearchFilter, RecipeFilter,
+                      RecipeSearchFilter)
+from .cache import recipe_cache, reference_cache
+from .indexes import ingredient_index, recipe_ingredient_index
+from .pagination import (FeedPagination, PageLimitPagination,
+                         RecipePagination)
+from .uploads import (MaxSizeUploadHandler, UploadTooLarge, make_upload_handle,
+                      save_image, stream_to_tempfile)
+
+
+class ReferenceDataMixin:
+    reference_name = None
+
+    def list(self, request, *args, **kwargs):
+        if (any(request.query_params.values())
+                or request.accepted_renderer.format != 'json'):
+            return super().list(request, *args, **kwargs)
+        return reference_cache.respond(
+            request,
+            self.reference_name,
+            lambda: JSONRenderer().render(super(
+                ReferenceDataMixin, self).list(request, *args, **kwargs).data)
+        )
+
 
+class UserViewSet(djoser_views.UserViewSet):
+    pagination_class = PageLimitPagination
+    lookup_field = 'pk'
+    lookup_value_regex = r'\d+'
 
-class UserViewSet(viewsets.GenericViewSet):
-    queryset = User.objects.all()
-    serializer_class = serializers.UserSerializer
-    pagination_class = PageNumberPagination
-    filter_backends = (filters.OrderingFilter, )
-    ordering = ('-id',)
+    def get_queryset(self):
+        return with_is_subscribed(super().get_queryset(), self.request.user)
 
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
     )
     def subscribe(self, request, pk):
+        if int(pk) == request.user.id:
+            return Response(
+                'You can not subscribe to yourself!',
+                status=status.HTTP_400_BAD_REQUEST)
         if request.method == 'POST':
-            author = get_object_or_404(User, id=pk)
-            subscription = Subscription.objects.create(
-                user=request.user,
-                author=author
-            )
-            serializer = serializers.SubscriptionSerializer(
-                subscription, context={'request': request}
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            author = get_object_or_404(User, id=pk)
-            subscription = get_object_or_404(
-                Subscription,
-                user=request.user,
-                author_id=pk)
-            subscription.delete()
-            serializer = serializers.SubscriptionSerializer(
-                subscription, context={'request': request}
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            author = Subscription.objects.add(request.user, pk)
+        else:
+            author = Subscription.objects.remove(request.user, pk)
+        if author is None:
+            raise Http404
+        subscription = Subscription(user=request.user, author=author)
+        subscription.is_subscribed = request.method == 'POST'
+        serializer = serializers.SubscriptionSerializer(
+            subscription, context={'request': request}
+        )
+        created = request.method == 'POST' and author.changed
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
     @action(
         detail=False,
         methods=['GET'],
-        pagination_class=PageNumberPagination
+        pagination_class=PageLimitPagination
     )
     def subscriptions(self, request):
         page = self.paginate_queryset(
-            Subscription.objects.filter(user=request.user))
+            Subscription.objects.filter(
+                user=request.user
+            ).select_related('author').annotate(
+                is_subscribed=Value(True)
+            ).order_by('id')
+        )
+        recipes_limit = request.query_params.get('recipes_limit', '')
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_per_author(
+                [subscription.author_id for subscription in page],
+                int(recipes_limit) if recipes_limit.isdigit() else None):
+            recipes[recipe.author_id].append(recipe)
+        for subscription in page:
+            subscription.latest_recipes = recipes[subscription.author_id]
         serializer = serializers.SubscriptionSerializer(
             page,
             many=True,
@@ -72,42 +114,220 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
-    pagination_class = PageNumberPagination
-    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
+    pagination_class = RecipePagination
+    lookup_value_regex = r'\d+'
+    filter_backends = (
+        DjangoFilterBackend, filters.OrderingFilter, RecipeSearchFilter)
     filterset_class = RecipeFilter
-    ordering = ('-pub_date',)
+    ordering_fields = ('pub_date', 'favorites_count', 'cooking_time')
+    ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        user = self.request.user
+        return Recipe.objects.with_user_flags(user).with_related(user)
+
+    def list(self, request, *args, **kwargs):
+        return recipe_cache.respond(
+            request, lambda: super(RecipeViewSet, self).list(
+                request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_cache.respond(
+            request, lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs)
+        )
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, methods=['GET'])
+    def by_ingredients(self, request):
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids:
+            return Response(
+                'Pass ingredient ids as the "ingredients" parameter!',
+                status=status.HTTP_400_BAD_REQUEST)
+        paginator = PageLimitPagination()
+        page = paginator.paginate_queryset(
+            recipe_ingredient_index.rank(ingredient_ids), request, self)
+        recipes = Recipe.objects.prefetch_related(Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredients.objects.select_related('ingredients')
+        )).in_bulk([recipe_id for recipe_id, _, _ in page])
+        results = []
+        for recipe_id, matched, total in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_count = matched
+            recipe.ingredients_count = total
+            results.append(recipe)
+        serializer = serializers.IngredientCoverageSerializer(
+            results,
+            many=True,
+            context={'request': request, 'ingredients': ingredient_ids}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk):
+        similarities = RecipeSimilarity.objects.filter(
+            recipe_id=pk).select_related('similar').defer(
+                'similar__search_vector').order_by('-score', 'similar_id')
+        if not similarities:
+            get_object_or_404(Recipe, id=pk)
+        recipes = []
+        for similarity in similarities:
+            similarity.similar.score = round(similarity.score, 4)
+            recipes.append(similarity.similar)
+        serializer = serializers.SimilarRecipeSerializer(
+            recipes, many=True, context={'request': request})
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=(IsAuthenticated,),
+        url_path='images'
+    )
+    def upload_image(self, request):
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if int(request.META.get('CONTENT_LENGTH') or 0) > max_size:
+            return Response(
+                f'Image should be at most {max_size} bytes!',
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if request.content_type.startswith('multipart/form-data'):
+            handler = MaxSizeUploadHandler(max_size, request)
+            request.upload_handlers.insert(0, handler)
+            file = request.FILES.get('image')
+            if handler.exceeded:
+                return Response(
+                    f'Image should be at most {max_size} bytes!',
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            if file is None:
+                return Response(
+                    'Attach the image as the "image" field!',
+                    status=status.HTTP_400_BAD_REQUEST)
+        elif request.stream is None:
+            return Response(
+                'Attach the image as the request body!',
+                status=status.HTTP_400_BAD_REQUEST)
+        else:
+            try:
+                file = stream_to_tempfile(request.stream, max_size)
+            except UploadTooLarge:
+                return Response(
+                    f'Image should be at most {max_size} bytes!',
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        with file:
+            name = save_image(file)
+        return Response({
+            'image_upload': make_upload_handle(request.user, name),
+            'image': request.build_absolute_uri(default_storage.url(name)),
+        }, status=status.HTTP_201_CREATED)
+
+    def toggle_recipe(self, request, model, pk):
+        if request.method == 'POST':
+            recipe = model.objects.add(request.user, pk)
+        else:
+            recipe = model.objects.remove(request.user, pk)
+        if recipe is None:
+            raise Http404
+        serializer = serializers.ShortRecipeSerializer(recipe)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
         permission_classes=(IsAuthenticated,)
     )
     def shopping_cart(self, request, pk):
-        if request.method == 'POST':
-            if Cart.objects.filter(user=request.user, recipe_id=pk).exists():
-                return Response(
-                    'Recipe is already in the cart!',
-                    status=status.HTTP_400_BAD_REQUEST)
-            recipe = get_object_or_404(Recipe, id=pk)
-            Cart.objects.create(
-                user=request.user,
-                recipe=recipe
-            )
-            serializer = serializers.ShortRecipeSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=pk)
-            cart = get_object_or_404(
-                Cart,
-                user=self.request.user,
-                recipe_id=pk
-            )
-            cart.delete()
-            serializer = serializers.ShortRecipeSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.toggle_recipe(request, Cart, pk)
+
+    def parse_recipe_ids(self, request):
+        recipe_ids = (
+            request.data.get('recipes')
+            if isinstance(request.data, dict) else None
+        )
+        if (not isinstance(recipe_ids, list) or not recipe_ids
+                or len(recipe_ids) > settings.BATCH_MAX_RECIPES
+                or not all(type(pk) is int for pk in recipe_ids)):
+            return None
+        return list(dict.fromkeys(recipe_ids))
+
+    def change_recipes(self, request, model):
+        recipe_ids = self.parse_recipe_ids(request)
+        if recipe_ids is None:
+            return Response(
+                f'Pass a list of at most {settings.BATCH_MAX_RECIPES} '
+                f'recipe ids as "recipes"!',
+                status=status.HTTP_400_BAD_REQUEST)
+        present = dict(Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            present=Exists(model.objects.filter(
+                user=request.user, recipe=OuterRef('pk')))
+        ).values_list('id', 'present'))
+        adding = request.method == 'POST'
+        changed = {
+            pk for pk, is_present in present.items() if is_present != adding
+        }
+        if adding:
+            model.objects.bulk_create([
+                model(user=request.user, recipe_id=pk) for pk in changed
+            ], ignore_conflicts=True)
+        else:
+            rows = model.objects.filter(
+                user=request.user, recipe_id__in=changed)
+            rows._raw_delete(rows.db)
+        recount_targets(model, changed)
+        done, unchanged = (
+            ('added', 'exists') if adding else ('removed', 'missing'))
+        return Response([
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in present
+                    else done if pk in changed else unchanged
+                ),
+            }
+            for pk in recipe_ids
+        ])
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart'
+    )
+    def shopping_cart_batch(self, request):
+        return self.change_recipes(request, Cart)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite'
+    )
+    def favorite_batch(self, request):
+        return self.change_recipes(request, Favorite)
 
     @action(
         detail=False,
@@ -115,24 +335,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        final_list = {}
         ingredients = RecipeIngredients.objects.filter(
-            recipe__cart__user=request.user).values_list(
-            'ingredients__name', 'ingredients__measurement_unit',
-            'amount')
-        for item in ingredients:
-            name = item[0]
-            if name not in final_list:
-                final_list[name] = {
-                    'measurement_unit': item[1],
-                    'amount': item[2]
-                }
-            else:
-                final_list[name]['amount'] += item[2]
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_list.pdf"')
-        http2pdf(response, final_list)
+            recipe__cart__user=request.user
+        ).values(
+            name=F('ingredients__name'),
+            measurement_unit=F('ingredients__measurement_unit')
+        ).annotate(amount=Sum('amount')).order_by('name')
+        response = FileResponse(
+            shopping_list_pdf(ingredients),
+            as_attachment=True,
+            filename='shopping_list.pdf',
+            content_type='application/pdf'
+        )
         return response
 
     @action(
@@ -141,26 +355,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def favorite(self, request, pk):
-        if request.method == 'POST':
-            if Favorite.objects.filter(
-                    user=request.user,
-                    recipe_id=pk).exists():
-                return Response(
-                    'Recipe is already favorite!',
-                    status=status.HTTP_400_BAD_REQUEST)
-            recipe = get_object_or_404(Recipe, id=pk)
-            Favorite.objects.create(
-                user=request.user,
-                recipe_id=pk
-            )
-            serializer = serializers.ShortRecipeSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        if request.method == 'DELETE':
-            recipe = get_object_or_404(Recipe, id=pk)
-            favorite = get_object_or_404(Favorite, recipe_id=pk)
-            favorite.delete()
-            serializer = serializers.ShortRecipeSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.toggle_recipe(request, Favorite, pk)
 
 
 class RecipeIngredientsViewSet(viewsets.ModelViewSet):
@@ -168,9 +363,10 @@ class RecipeIngredientsViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.RecipeIngredientsSerializer
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReferenceDataMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    reference_name = 'ingredients'
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = IngredientSearchFilter
     filterset_fields = ('name',)
@@ -178,8 +374,21 @@ class IngredientViewSet(viewsets.ModelViewSet):
     ordering = ('id',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if request.query_params.get('limit', '').isdigit():
+            limit = min(int(request.query_params['limit']), limit)
+        serializer = self.get_serializer(
+            ingredient_index.search(name, limit), many=True
+        )
+        return Response(serializer.data)
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ReferenceDataMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    reference_name = 'tags'
     pagination_class = None
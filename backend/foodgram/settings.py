@@ -28,6 +28,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
@@ -39,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.performance.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -90,6 +93,60 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/1'),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = 60 * 10
+
+RECIPE_CACHE_CONTROL = 'no-cache'
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+
+REFERENCE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+TOKEN_CACHE_TIMEOUT = 60
+
+TOKEN_LOCAL_CACHE_TIMEOUT = 5
+
+TOKEN_LOCAL_CACHE_SIZE = 10000
+
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+
+REPEATED_QUERY_THRESHOLD = int(os.getenv('REPEATED_QUERY_THRESHOLD', 10))
+
+SLOW_REQUEST_FINGERPRINTS = 10
+
+METRICS_PATH = '/metrics'
+
+SEARCH_CONFIG = 'russian'
+
+SEARCH_FUZZY_CUTOFF = 0.6
+
+SEARCH_MAX_RESULTS = 1000
+
+QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', '').lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.getenv('API_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -134,8 +191,41 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_VARIANTS_DIR = 'recipes/images/variants'
+IMAGE_VARIANTS = {
+    'thumbnail': 240,
+    'card': 640,
+    'full': 1280,
+}
+IMAGE_QUALITY = 80
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_UPLOAD_MAX_AGE = 60 * 60
+IMAGE_MAX_PIXELS = 40_000_000
+
 PAGINATOR_AMOUNT = 6
 
+MAX_PAGE_SIZE = 100
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+BATCH_MAX_RECIPES = 100
+
+RECIPE_INDEX_CHANGE_TIMEOUT = 60 * 60
+
+RECIPE_INDEX_MAX_CHANGES = 1000
+
+SIMILAR_RECIPES_COUNT = 10
+
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+
+SIMILAR_RECIPES_CHUNK_SIZE = 128
+
+SIMILAR_RECIPES_NEIGHBOUR_UPDATES = 1000
+
+SIMILAR_RECIPES_CANDIDATES = 2000
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 # CORS_ORIGIN_ALLOW_ALL = True
@@ -150,9 +240,9 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitPagination',
     'PAGE_SIZE': 6,
 }
 
@@ -34,7 +34,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'image',
         'text',
         'cooking_time',
-        'get_favorites'
+        'favorites_count',
+        'carts_count'
     )
     list_filter = (
         'name',
@@ -43,10 +44,6 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     inlines = (IngredientInline,)
 
-    def get_favorites(self, obj):
-        return obj.favorites.count()
-    get_favorites.short_description = 'favorites'
-
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
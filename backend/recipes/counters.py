@@ -0,0 +1,49 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = {
+    'recipes.Favorite': ('recipe', 'favorites_count'),
+    'recipes.Cart': ('recipe', 'carts_count'),
+    'recipes.Subscription': ('author', 'followers_count'),
+    'recipes.Recipe': ('author', 'recipes_count'),
+}
+
+
+def change_counter(instance, delta):
+    field, counter = COUNTERS[instance._meta.label]
+    target = instance._meta.get_field(field).related_model
+    target.objects.filter(
+        pk=getattr(instance, f'{field}_id')
+    ).update(**{counter: F(counter) + delta})
+
+
+def recount_targets(model, target_ids=None):
+    field, counter = COUNTERS[model._meta.label]
+    targets = model._meta.get_field(field).related_model.objects.all()
+    if target_ids is not None:
+        targets = targets.filter(pk__in=target_ids)
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+    ).values(field).annotate(total=Count('pk')).values('total')
+    targets.update(**{counter: Coalesce(Subquery(rows), 0)})
+
+
+def recount(apps):
+    for label in COUNTERS:
+        recount_targets(apps.get_model(label))
+
+
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes.Favorite', 'recipe', 'favorites_count'),
+    ('recipes.Cart', 'recipe', 'carts_count'),
+    ('recipes.Subscription', 'author', 'followers_count'),
+    ('recipes.Recipe', 'author', 'recipes_count'),
+)
+
+
+def recount_counters(apps, schema_editor):
+    for label, field, counter in COUNTERS:
+        model = apps.get_model(label)
+        target = model._meta.get_field(field).related_model
+        rows = model.objects.filter(**{field: OuterRef('pk')}).order_by(
+        ).values(field).annotate(total=Count('pk')).values('total')
+        target.objects.update(**{counter: Coalesce(Subquery(rows), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_unique_ingredient'),
+        ('users', '0004_user_followers_count_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Shopping carts count'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Favorites count'),
+        ),
+        migrations.RunPython(recount_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.2 on 2026-10-18 17:04
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_carts(apps, schema_editor):
+    Cart = apps.get_model('recipes', 'Cart')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    duplicates = list(Cart.objects.values('user', 'recipe').annotate(
+        keep=Min('id'), total=Count('id')).filter(total__gt=1).order_by())
+    for row in duplicates:
+        Cart.objects.filter(user=row['user'], recipe=row['recipe']).exclude(
+            id=row['keep']).delete()
+    rows = Cart.objects.filter(recipe=OuterRef('pk')).order_by().values(
+        'recipe').annotate(total=Count('pk')).values('total')
+    Recipe.objects.filter(
+        pk__in={row['recipe'] for row in duplicates}
+    ).update(carts_count=Coalesce(Subquery(rows), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_similarity'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique cart recipe'),
+        ),
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_user_recipe_idx',
+        ),
+    ]
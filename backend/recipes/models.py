@@ -1,8 +1,16 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import (Exists, F, OuterRef, Prefetch, Q, Value,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber, Upper
 
 from api.validators import hex_code_validator
 from users.models import User
+from .counters import CounterFieldsMixin
+from .toggles import ToggleQuerySet
 
 
 class Tag(models.Model):
@@ -43,11 +51,109 @@ class Ingredient(models.Model):
         max_length=50
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique ingredient'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_upper_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+def with_is_subscribed(users, user):
+    if user.is_anonymous:
+        return users.annotate(is_subscribed=Value(False))
+    return users.annotate(is_subscribed=Exists(
+        Subscription.objects.filter(user=user, author=OuterRef('pk'))))
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
+    def with_related(self, user):
+        return self.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=with_is_subscribed(User.objects.all(), user)
+            ),
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredients')
+            )
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        recipes = self.filter(author_id__in=author_ids).order_by(
+            '-pub_date', '-id')
+        if limit is None or not author_ids:
+            return recipes
+        ranked = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            'ORDER BY pub_date DESC, id DESC',
+            (*params, limit)
+        )
+
+    def followed_by(self, user, before=None, limit=None):
+        if connections[self.db].vendor != 'postgresql' or limit is None:
+            recipes = self.filter(author__subscription__user=user)
+            if before is not None:
+                pub_date, pk = before
+                recipes = recipes.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+                )
+            return recipes.order_by('-pub_date', '-id')[:limit]
+        condition, params = '', ()
+        if before is not None:
+            condition = 'AND (recipe.pub_date, recipe.id) < (%s, %s)'
+            params = tuple(before)
+        latest = RawSQL(
+            f'SELECT latest.id FROM {Subscription._meta.db_table} '
+            f'subscription CROSS JOIN LATERAL ('
+            f'SELECT recipe.id, recipe.pub_date '
+            f'FROM {Recipe._meta.db_table} recipe '
+            f'WHERE recipe.author_id = subscription.author_id {condition} '
+            f'ORDER BY recipe.pub_date DESC, recipe.id DESC LIMIT %s'
+            f') latest WHERE subscription.user_id = %s '
+            f'ORDER BY latest.pub_date DESC, latest.id DESC LIMIT %s',
+            (*params, limit, user.pk, limit)
+        )
+        return self.filter(pk__in=latest).order_by('-pub_date', '-id')
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -64,6 +170,12 @@ class Recipe(models.Model):
         upload_to='recipes/images',
         help_text='Upload your image'
     )
+    image_variants = models.JSONField(
+        verbose_name='Image variants',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField(
         verbose_name='Text',
         help_text='Type your recipe'
@@ -92,6 +204,52 @@ class Recipe(models.Model):
         verbose_name='Publication date',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Favorites count',
+        default=0,
+        editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        verbose_name='Shopping carts count',
+        default=0,
+        editable=False
+    )
+
+    search_vector = SearchVectorField(
+        verbose_name='Search vector',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeManager()
+
+    counter_fields = ('favorites_count', 'carts_count')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['name'],
+                opclasses=['varchar_pattern_ops'],
+                name='recipe_name_pattern_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+            GinIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='recipe_name_trigram_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -101,7 +259,7 @@ class RecipeIngredients(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         verbose_name='Recipe',
-        related_name='+',
+        related_name='recipe_ingredients',
         on_delete=models.CASCADE
     )
     ingredients = models.ForeignKey(
@@ -122,6 +280,53 @@ class RecipeIngredients(models.Model):
         default=1
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredients'],
+                name='recipe_ingredient_idx'
+            ),
+        ]
+
+
+class RecipeSimilarity(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Recipe',
+        related_name='similarities',
+        on_delete=models.CASCADE
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Similar recipe',
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField(verbose_name='Similarity score')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique similar recipe'
+            ),
+        ]
+
+
+class ImageUpload(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Uploader',
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    image = models.CharField(max_length=255, verbose_name='Image file')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Uploaded'
+    )
+
 
 class Subscription(models.Model):
     user = models.ForeignKey(
@@ -137,6 +342,8 @@ class Subscription(models.Model):
         verbose_name='Author'
     )
 
+    objects = ToggleQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -164,6 +371,8 @@ class Favorite(models.Model):
         on_delete=models.CASCADE
     )
 
+    objects = ToggleQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -185,3 +394,13 @@ class Cart(models.Model):
         related_name='cart',
         on_delete=models.CASCADE
     )
+
+    objects = ToggleQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique cart recipe'
+            ),
+        ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class PostgresOnlyMixin:
+    def allowed(self, schema_editor):
+        return schema_editor.connection.vendor == 'postgresql'
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if self.allowed(schema_editor):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if self.allowed(schema_editor):
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+
+class AddPostgresIndex(PostgresOnlyMixin, migrations.AddIndex):
+    pass
+
+
+class RunPostgresSQL(PostgresOnlyMixin, migrations.RunSQL):
+    pass
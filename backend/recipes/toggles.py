@@ -0,0 +1,72 @@
+from django.db import IntegrityError, connections, models, transaction
+
+from .counters import COUNTERS
+
+ADD = (
+    'INSERT INTO {table} ({user}, {field}) SELECT %s, {pk} FROM target '
+    'ON CONFLICT DO NOTHING RETURNING {field}'
+)
+REMOVE = (
+    'DELETE FROM {table} WHERE {user} = %s '
+    'AND {field} IN (SELECT {pk} FROM target) RETURNING {field}'
+)
+TOGGLE = (
+    'WITH target AS ({target}), changed AS ({change}), '
+    'counted AS (UPDATE {target_table} SET {counter} = {counter} + %s '
+    'WHERE {pk} IN (SELECT {field} FROM changed)) '
+    'SELECT target.*, EXISTS (SELECT 1 FROM changed) AS changed '
+    'FROM target'
+)
+
+
+class ToggleQuerySet(models.QuerySet):
+    def get_target(self):
+        field, counter = COUNTERS[self.model._meta.label]
+        field = self.model._meta.get_field(field)
+        return field, field.related_model._default_manager, counter
+
+    def toggle(self, user, pk, change, delta):
+        field, targets, counter = self.get_target()
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        target_sql, params = targets.filter(
+            pk=pk).query.sql_with_params()
+        names = {
+            'table': quote(self.model._meta.db_table),
+            'user': quote(self.model._meta.get_field('user').column),
+            'field': quote(field.column),
+            'pk': quote(targets.model._meta.pk.column),
+            'target_table': quote(targets.model._meta.db_table),
+            'counter': quote(counter),
+        }
+        sql = TOGGLE.format(
+            target=target_sql, change=change.format(**names), **names)
+        return next(iter(targets.raw(
+            sql, (*params, user.pk, delta), using=self.db)), None)
+
+    def add(self, user, pk):
+        if connections[self.db].vendor == 'postgresql':
+            return self.toggle(user, pk, ADD, 1)
+        field, targets, _ = self.get_target()
+        target = targets.filter(pk=pk).first()
+        if target is None:
+            return None
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(user=user, **{field.name: target})
+            target.changed = True
+        except IntegrityError:
+            target.changed = False
+        return target
+
+    def remove(self, user, pk):
+        if connections[self.db].vendor == 'postgresql':
+            return self.toggle(user, pk, REMOVE, -1)
+        field, targets, _ = self.get_target()
+        target = targets.filter(pk=pk).first()
+        if target is None:
+            return None
+        deleted, _ = self.filter(
+            user=user, **{field.attname: target.pk}).delete()
+        target.changed = bool(deleted)
+        return target
@@ -2,16 +2,18 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
 
+from recipes.counters import CounterFieldsMixin
 from .validators import UsernameValidator
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
         'username',
         'first_name',
         'last_name'
     ]
+    counter_fields = ('recipes_count', 'followers_count')
 
     username = models.CharField(
         max_length=150,
@@ -35,6 +37,16 @@ class User(AbstractUser):
         blank=False,
         null=False
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Recipes count',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Followers count',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.username